@@ -1,35 +1,43 @@
 import os
 import json
-import csv
+import asyncio
+import queue
+import threading
+import uuid
 from datetime import datetime
 import streamlit as st
-from groq import Groq
-from langchain.chains import ConversationChain
-from langchain.chains.conversation.memory import ConversationBufferWindowMemory
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
 
-# Constants for different personas
+# System instructions for the different personas
 PERSONAS = {
-    'Default': """You are a helpful AI assistant.
-                  Current conversation:
-                  {history}
-                  Human: {input}
-                  AI:""",
+    'Default': "You are a helpful AI assistant.",
     'Expert': """You are an expert consultant with deep knowledge across multiple domains.
-                 Please provide detailed, technical responses when appropriate.
-                 Current conversation:
-                 {history}
-                 Human: {input}
-                 Expert:""",
+                 Please provide detailed, technical responses when appropriate.""",
     'Creative': """You are a creative and imaginative AI that thinks outside the box.
-                  Feel free to use metaphors and analogies in your responses.
-                  Current conversation:
-                  {history}
-                  Human: {input}
-                  AI:"""
+                  Feel free to use metaphors and analogies in your responses."""
 }
 
+PERSONA_NAMES = tuple(PERSONAS)
+
+# Groq chat models offered in the sidebar
+MODELS = ('mixtral-8x7b-32768', 'llama3-70b-8192', 'llama3-8b-8192')
+
+SUMMARY_PROMPT = """Progressively summarize the lines of conversation provided, adding onto the previous summary.
+                Keep any instructions or facts from the human that later answers may depend on.
+                Previous summary:
+                {summary}
+                New lines of conversation:
+                {history}
+                New summary:"""
+
+# Number of most recent turns drawn on each rerun, and per "show earlier" click
+HISTORY_PAGE_SIZE = 20
+
+# Most Groq requests in flight at once, shared by every user of the app
+MAX_CONCURRENT_REQUESTS = 8
+
+# Directory holding one JSON-lines file of turns per chat session
+SESSIONS_DIR = "sessions"
+
 # Streamlit page configuration
 st.set_page_config(
     page_title="Groq Chat Assistant",
@@ -38,33 +46,241 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+def get_session_id():
+    # Kept in the URL so a browser refresh resumes the same session file.
+    session_id = st.query_params.get('session', '')
+    try:
+        session_id = uuid.UUID(session_id).hex
+    except ValueError:
+        session_id = uuid.uuid4().hex
+    st.query_params['session'] = session_id
+    return session_id
+
+def get_session_path(session_id):
+    return os.path.join(SESSIONS_DIR, f"{session_id}.jsonl")
+
+def load_session(session_id):
+    # Read directly: it runs once per browser session, and caching it would
+    # keep a copy of every resumed chat in memory, deleted ones included.
+    path = get_session_path(session_id)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def persist_turn(session_id, turn):
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    with open(get_session_path(session_id), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(turn) + "\n")
+
+def save_session(session_id, turns):
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    with open(get_session_path(session_id), 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(turn) + "\n" for turn in turns)
+
+def start_persisting():
+    # Turns made before the box was ticked are written once here; after that
+    # record_turn only appends.
+    if st.session_state.persist_history:
+        save_session(st.session_state.session_id, st.session_state.chat_history)
+
+def delete_session(session_id):
+    path = get_session_path(session_id)
+    if os.path.exists(path):
+        os.remove(path)
+
 def initialize_session_state():
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = get_session_id()
     if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        path = get_session_path(st.session_state.session_id)
+        st.session_state.chat_history = load_session(st.session_state.session_id)
+        # A session that was being saved keeps being saved once resumed.
+        if os.path.exists(path) and 'persist_history' not in st.session_state:
+            st.session_state.persist_history = True
     if 'total_message' not in st.session_state:
         st.session_state.total_message = 0
     if 'start_time' not in st.session_state:
         st.session_state.start_time = None
     if 'groq_api_key' not in st.session_state:
         st.session_state.groq_api_key = None
+    if 'summary' not in st.session_state:
+        st.session_state.summary = ""
+    if 'summary_covers_upto' not in st.session_state:
+        st.session_state.summary_covers_upto = 0
+    if 'topic_start' not in st.session_state:
+        st.session_state.topic_start = 0
+    if 'rendered_turns' not in st.session_state:
+        st.session_state.rendered_turns = HISTORY_PAGE_SIZE
+
+@st.cache_resource
+def get_groq_client(api_key):
+    # groq, httpx and langchain are imported where first needed so the page
+    # can render before their import cost is paid.
+    from groq import Groq
+    return Groq(api_key=api_key)
+
+@st.cache_resource
+def get_async_http_client():
+    import httpx
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS),
+        timeout=httpx.Timeout(60.0, connect=5.0)
+    )
+
+@st.cache_resource
+def get_async_groq_client(api_key):
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=api_key, http_client=get_async_http_client())
 
-def get_custom_prompt():
-    persona = st.session_state.get('selected_persona', 'Default')
-    return PromptTemplate(
-        input_variables=["history", "input"],
-        template=PERSONAS[persona]
+@st.cache_resource
+def build_chat_model(model, api_key):
+    from langchain_groq import ChatGroq
+    # Every model shares the cached Groq clients and their HTTP connections.
+    return ChatGroq(
+        client=get_groq_client(api_key).chat.completions,
+        async_client=get_async_groq_client(api_key).chat.completions,
+        groq_api_key=api_key,
+        model_name=model,
+        streaming=True
     )
 
-def display_chat_history():
-    for message in st.session_state.chat_history:
-        with st.container():
-            st.write("You:")
-            st.info(message['human'])
+@st.cache_resource
+def get_event_loop():
+    # One loop in a daemon thread for the whole app, so the shared async
+    # client is only ever used from the loop it first ran on.
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_request_semaphore():
+    return asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+async def with_request_slot(semaphore, coro):
+    async with semaphore:
+        return await coro
+
+def run_on_loop(coro):
+    # Blocks the calling script thread until the coroutine has run on the
+    # shared loop.
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+def run_async(coro):
+    return run_on_loop(with_request_slot(get_request_semaphore(), coro))
+
+def iterate_async(stream):
+    # Bridges a token stream running on the shared loop to the plain
+    # generator st.write_stream expects.
+    chunks = queue.Queue()
+    semaphore = get_request_semaphore()
+    done = object()
+
+    async def pump():
+        try:
+            async with semaphore:
+                async for chunk in stream:
+                    chunks.put(chunk.content)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_event_loop())
+    try:
+        while (chunk := chunks.get()) is not done:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # If the reader stops early (rerun, stop, or write_stream raising),
+        # stop the request too so it frees its slot and stops using tokens.
+        future.cancel()
+
+def get_history_window():
+    # The model only sees the messages not yet folded into the summary, which
+    # update_summary() keeps bounded.
+    return st.session_state.messages[2 * st.session_state.summary_covers_upto:]
+
+def initialize_messages():
+    # Built after the chat has been drawn, so a new session does not import
+    # langchain_core before the page first renders.
+    if 'messages' not in st.session_state:
+        st.session_state.messages = to_messages(st.session_state.chat_history)
+
+def to_messages(turns):
+    # chat_history keeps the turns for display and persistence; the same
+    # conversation is held as one message list that every persona and model
+    # reads from, so switching either never rebuilds it.
+    from langchain_core.messages import AIMessage, HumanMessage
+    messages = []
+    for turn in turns:
+        messages.append(HumanMessage(content=turn['human']))
+        messages.append(AIMessage(content=turn['AI']))
+    return messages
+
+def build_history():
+    from langchain_core.messages import SystemMessage
+    history = get_history_window()
+    if st.session_state.summary:
+        summary = SystemMessage(content=f"Summary of earlier conversation: {st.session_state.summary}")
+        history = [summary, *history]
+    return history
+
+def update_summary(groq_chat, memory_length):
+    # Once more than twice the window is uncovered, fold everything but the
+    # last memory_length turns into the summary with a single extra call.
+    start = st.session_state.summary_covers_upto
+    end = len(st.session_state.chat_history) - memory_length
+    if end - start <= memory_length:
+        return
+
+    from langchain_core.messages import get_buffer_string
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=st.session_state.summary,
+        history=get_buffer_string(st.session_state.messages[2 * start:2 * end])
+    )
+    with st.spinner("📝 Summarizing earlier conversation..."):
+        st.session_state.summary = run_async(groq_chat.ainvoke(prompt)).content
+    st.session_state.summary_covers_upto = end
 
-        with st.container():
-            st.write(f"Assistance ({st.session_state.selected_persona} mode):")
-            st.success(message['AI'])
-        st.write("")
+def render_message(message):
+    with st.chat_message("user"):
+        st.write(message['human'])
+    with st.chat_message("assistant"):
+        st.write(message['AI'])
+
+def count_hidden_turns():
+    return max(0, len(st.session_state.chat_history) - st.session_state.rendered_turns)
+
+def show_earlier_messages():
+    st.session_state.rendered_turns += HISTORY_PAGE_SIZE
+
+def show_earlier_messages_button():
+    # Kept outside the render_chat fragment: a click has to rerun the whole
+    # script, or turns drawn next to the fragment by the send path in the
+    # previous run would stay on screen and be drawn again by it.
+    hidden = count_hidden_turns()
+    if hidden:
+        st.button(
+            f"⬆️ Show earlier messages ({hidden} hidden)",
+            on_click=show_earlier_messages,
+            use_container_width=True
+        )
+
+@st.fragment
+def render_chat():
+    # Streamlit resends every element it draws on each rerun, so only the
+    # latest page of turns is drawn and older ones are loaded on request.
+    for message in st.session_state.chat_history[count_hidden_turns():]:
+        render_message(message)
+
+@st.cache_data(ttl=1)
+def format_duration(start_time):
+    # Recomputed at most once a second, however often the script reruns.
+    duration = datetime.now() - datetime.fromisoformat(start_time)
+    return duration.seconds // 60, duration.seconds % 60
 
 def display_chat_statistics():
     if st.session_state.start_time:
@@ -73,31 +289,155 @@ def display_chat_statistics():
         with col1:
             st.metric("Messages", len(st.session_state.chat_history))
         with col2:
-            duration = datetime.now() - st.session_state.start_time
-            st.metric("Duration", f"{duration.seconds // 60}m {duration.seconds % 60}s")
+            minutes, seconds = format_duration(st.session_state.start_time.isoformat())
+            st.metric("Duration", f"{minutes}m {seconds}s")
 
 def clear_chat_history():
     if st.button("🛢️ Clear Chat History", use_container_width=True):
         st.session_state.chat_history = []
+        st.session_state.messages = []
+        delete_session(st.session_state.session_id)
+        st.session_state.summary = ""
+        st.session_state.summary_covers_upto = 0
+        st.session_state.topic_start = 0
+        st.session_state.rendered_turns = HISTORY_PAGE_SIZE
         st.session_state.start_time = None
         st.rerun()
 
-def handle_send_button(model, memory, conversation, user_question):
-    with st.spinner("🤔 Thinking..."):
-        try:
-            response = conversation(user_question)
-            message = {
-                "human": user_question,
-                "AI": response['response']
-            }
-            st.session_state.chat_history.append(message)
-            st.rerun()
-        except Exception as e:
-            st.error(f"Error: {str(e)}")
+def build_prompt(history, user_question):
+    # Assembled by hand and sent with invoke/stream; no chain or memory
+    # objects sit between the message list and the Groq call.
+    from langchain_core.messages import HumanMessage, SystemMessage
+    return [
+        SystemMessage(content=PERSONAS[st.session_state.selected_persona]),
+        *history,
+        HumanMessage(content=user_question)
+    ]
+
+def stream_reply(groq_chat, user_question):
+    return iterate_async(groq_chat.astream(build_prompt(build_history(), user_question)))
+
+def run_batch(groq_chat, prompts):
+    # Independent prompts go out concurrently rather than one after another,
+    # each taking its own request slot. They always run on the shared loop:
+    # asyncio.run would give each batch a new loop, leaving the cached async
+    # client's pooled connections tied to a loop that has already closed.
+    if not prompts:
+        return []
+    semaphore = get_request_semaphore()
+
+    async def batch():
+        return await asyncio.gather(*(
+            with_request_slot(semaphore, groq_chat.ainvoke(prompt))
+            for prompt in prompts
+        ))
+
+    return [response.content for response in run_on_loop(batch())]
+
+def record_turn(turn):
+    st.session_state.chat_history.append(turn)
+    st.session_state.messages.extend(to_messages([turn]))
+    if st.session_state.persist_history:
+        persist_turn(st.session_state.session_id, turn)
+
+def handle_user_message(groq_chat, memory_length, user_question, chat_container):
+    # Draw just the new turn instead of rerunning the whole script.
+    with chat_container:
+        with st.chat_message("user"):
+            st.write(user_question)
+        with st.chat_message("assistant"):
+            try:
+                update_summary(groq_chat, memory_length)
+                reply = st.write_stream(stream_reply(groq_chat, user_question))
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
+                return
+
+    record_turn({
+        "human": user_question,
+        "AI": reply
+    })
+
+def handle_batch_questions(groq_chat, memory_length, chat_container):
+    with st.form("batch_questions", clear_on_submit=True):
+        questions = st.text_area(
+            "Queue several questions, one per line",
+            height=100
+        )
+        submitted = st.form_submit_button("📨 Send All", use_container_width=True)
 
-def handle_new_topic(memory):
+    questions = [question.strip() for question in questions.splitlines() if question.strip()]
+    if not submitted or not questions:
+        return
+
+    if not st.session_state.start_time:
+        st.session_state.start_time = datetime.now()
+    try:
+        update_summary(groq_chat, memory_length)
+        history = build_history()
+        with st.spinner("🤔 Thinking..."):
+            replies = run_batch(groq_chat, [build_prompt(history, question) for question in questions])
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return
+
+    for question, reply in zip(questions, replies):
+        turn = {
+            "human": question,
+            "AI": reply
+        }
+        record_turn(turn)
+        with chat_container:
+            render_message(turn)
+
+def get_turn_context_start(i, memory_length):
+    # A turn's context never reaches back past the topic it was asked in.
+    start = max(0, i - memory_length)
+    topic_start = st.session_state.topic_start
+    if i >= topic_start:
+        start = max(start, topic_start)
+    return start
+
+def handle_reprocess_history(groq_chat, memory_length):
+    if not st.button(
+        "🔁 Reprocess History",
+        use_container_width=True,
+        help="Answer every earlier question again in the current conversation style"
+    ):
+        return
+
+    history = st.session_state.chat_history
+    messages = st.session_state.messages
+    prompts = [
+        build_prompt(messages[2 * get_turn_context_start(i, memory_length):2 * i], turn['human'])
+        for i, turn in enumerate(history)
+    ]
+    try:
+        with st.spinner("🔁 Reprocessing history..."):
+            replies = run_batch(groq_chat, prompts)
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return
+
+    st.session_state.chat_history = [
+        {"human": turn['human'], "AI": reply}
+        for turn, reply in zip(history, replies)
+    ]
+    st.session_state.messages = to_messages(st.session_state.chat_history)
+    # The summary described the old answers; the next message resummarizes
+    # the current topic from the rewritten ones.
+    st.session_state.summary = ""
+    st.session_state.summary_covers_upto = st.session_state.topic_start
+    if st.session_state.persist_history:
+        save_session(st.session_state.session_id, st.session_state.chat_history)
+    st.rerun()
+
+def handle_new_topic():
     if st.button("🆕 New Topic", use_container_width=True):
-        memory.clear()
+        # Earlier turns stay on screen but drop out of the model's context.
+        st.session_state.summary = ""
+        st.session_state.summary_covers_upto = len(st.session_state.chat_history)
+        st.session_state.topic_start = st.session_state.summary_covers_upto
         st.success("Memory cleared for new topic!")
 
 def setup_sidebar():
@@ -115,7 +455,8 @@ def setup_sidebar():
         # Model selection
         model = st.selectbox(
             'Choose a model',
-            ['mixtral-8x7b-32768', 'llama3-70b-8192', 'llama3-8b-8192', 'whisper-large-v3-turbo'],
+            MODELS,
+            key='model',
             help="Select the AI model for your conversation"
         )
 
@@ -125,9 +466,17 @@ def setup_sidebar():
             help="Number of previous messages to remember"
         )
 
-        st.session_state.selected_persona = st.selectbox(
+        st.selectbox(
             'Select conversation style:',
-            ['Default', 'Expert', 'Creative']
+            PERSONA_NAMES,
+            key='selected_persona'
+        )
+
+        st.checkbox(
+            '💾 Save chat history',
+            key='persist_history',
+            on_change=start_persisting,
+            help="Keep this chat on disk so it can be resumed after a page refresh"
         )
 
         return model, memory_length
@@ -138,46 +487,34 @@ def main():
     model, memory_length = setup_sidebar()
 
     display_chat_statistics()
-    clear_chat_history()
 
     if not st.session_state.groq_api_key:
         st.warning("Please enter your Groq API Key to start the chat.")
         st.stop()
 
-    memory = ConversationBufferWindowMemory(k=memory_length)
-    groq_chat = ChatGroq(groq_api_key=st.session_state.groq_api_key, model_name=model)
-    conversation = ConversationChain(
-        llm=groq_chat,
-        memory=memory,
-        prompt=get_custom_prompt()
-    )
-
-    for message in st.session_state.chat_history:
-        memory.save_context(
-            {'input': message['human']},
-            {'output': message['AI']}
-        )
-
-    display_chat_history()
+    col1, col2 = st.columns(2)
+    with col1:
+        clear_chat_history()
+    with col2:
+        handle_new_topic()
 
-    st.markdown('### Your Message')
-    user_question = st.text_area(
-        "",
-        height=100,
-        placeholder="Type your message here...",
-        key="user_input"
-    )
+    chat_container = st.container()
+    with chat_container:
+        show_earlier_messages_button()
+        render_chat()
 
-    col1, col2, col3 = st.columns([3, 1, 1])
-    with col2:
-        send_button = st.button("📩 Send", use_container_width=True)
-    with col3:
-        handle_new_topic(memory)
+    groq_chat = build_chat_model(model, st.session_state.groq_api_key)
+    initialize_messages()
 
-    if send_button and user_question:
+    # chat_input only reruns the script when a message is submitted
+    if user_question := st.chat_input("Type your message..."):
         if not st.session_state.start_time:
             st.session_state.start_time = datetime.now()
-        handle_send_button(model, memory, conversation, user_question)
+        handle_user_message(groq_chat, memory_length, user_question, chat_container)
+
+    with st.expander("📦 Batch Requests"):
+        handle_batch_questions(groq_chat, memory_length, chat_container)
+        handle_reprocess_history(groq_chat, memory_length)
 
 if __name__ == "__main__":
     main()
@@ -1,18 +1,20 @@
 import streamlit as st
 import os
-from groq import Groq
-from langchain.chains import ConversationChain
-from langchain.chains.conversation.memory import ConversationBufferWindowMemory
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
-from dotenv import load_dotenv
-from dotenv import load_dotenv
-load_dotenv()
-import os 
+from datetime import datetime
 
-# Load environment variables from .env file
-load_dotenv()
-groq_api_key = os.environ['GROQ_API_KEY'] 
+# Persona system instructions
+PERSONAS = {
+    'Default': "You are a helpful AI assistant.",
+                
+    'Expert': """You are an expert consultant with deep knowledge across multiple domains.
+                Please provide detailed, technical responses when appropriate.""",
+    'Creative': """You are a creative and imaginative AI that thinks outside the box.
+                Feel free to use metaphors and analogies in your responses."""
+}
+
+PERSONA_NAMES=tuple(PERSONAS)
+
+MODELS=('mixtral-8x7b-32768', 'llama3-70b-8192', 'llama3-8b-8192')
 
 st.set_page_config(
     page_title="Groq chat Assistant",
@@ -29,37 +31,54 @@ def initialize_session_state():
         st.session_state.total_message=0
     if 'start_time' not in st.session_state:
         st.session_state.start_time=None
+    if 'topic_start' not in st.session_state:
+        st.session_state.topic_start=0
         
-def  get_custom_prompt():
-    """Get custom prompt template based on selected persona"""
-    persona = st.session_state.get('selected_persona', 'Default')
+@st.cache_resource
+def get_api_key():
+    """Load the Groq API key from the .env file once per process"""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.environ['GROQ_API_KEY']
 
-    personas = {
-        'Default': """You are a helpful AI assistant.
-                     Current conversation:
-                    {history}
-                    Human: {input}
-                    AI:""",
-                    
-        'Expert': """You are an expert consultant with deep knowledge across multiple domains.
-                    Please provide detailed, technical responses when appropriate.
-                    Current conversation:
-                    {history}
-                    Human: {input}
-                    Expert:""",
-        'Creative': """You are a creative and imaginative AI that thinks outside the box.
-                    Feel free to use metaphors and analogies in your responses.
-                    Current conversation:
-                    {history}
-                    Human: {input}
-                    AI:"""
-    }
-    
-    return PromptTemplate(
-        input_variables=["history","input"],
-        template=personas[persona]
+@st.cache_resource
+def get_chat_model(model, api_key):
+    """Create the Groq chat model once per model"""
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        groq_api_key=api_key,
+        model_name=model
     )
+
+def get_history_window(memory_length):
+    """Return the last memory_length turns of this session's current topic"""
+    turns=st.session_state.chat_history[st.session_state.topic_start:]
+    return turns[-memory_length:]
+
+def build_prompt(turns, user_question):
+    """Assemble the persona, the history window and the new question as chat messages"""
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    messages=[SystemMessage(content=PERSONAS[st.session_state.selected_persona])]
+    for turn in turns:
+        messages.append(HumanMessage(content=turn['human']))
+        messages.append(AIMessage(content=turn['AI']))
+    messages.append(HumanMessage(content=user_question))
+    return messages
     
+@st.fragment
+def chat_area():
+    """Display the chat history"""
+    for message in st.session_state.chat_history:
+        with st.container():
+            st.write(f"you")
+            st.info(message['human'])
+            
+        with st.container():
+            st.write(f"Assistance({st.session_state.selected_persona} mode)")
+            st.success(message['AI'])
+            
+        st.write("")
+        
 def main():
     initialize_session_state()
     
@@ -69,7 +88,8 @@ def main():
         st.subheader("Model Selection")
         model=st.selectbox(
             'Choose a model',
-            ['mixtral-8x7b-32768', 'llama3-70b-8192', 'llama3-8b-8192'],
+            MODELS,
+            key='model',
             help="Select the AI model for your conversation"
         )
         
@@ -81,9 +101,10 @@ def main():
         )
     
         st.subheader("AI Persona")
-        st.session_state.selected_persona=st.selectbox(
+        st.selectbox(
             'Select conversation style:',
-            ['Default','Expert','Creative']
+            PERSONA_NAMES,
+            key='selected_persona'
         )
         
         # Chat statistics
@@ -99,72 +120,38 @@ def main():
         # Clear chat button
         if st.button("🗑️ Clear Chat History", use_container_width=True):
             st.session_state.chat_history = []
+            st.session_state.topic_start = 0
             st.session_state.start_time = None
             st.rerun()
-
-    st.title("Groq chat Assistance")
-    memory=ConversationBufferWindowMemory(k=memory_length)
-    groq_chat=ChatGroq(
-        groq_api_key=groq_api_key,
-        model_name=model
-    )
-    
-    conversation=ConversationChain(
-        llm=groq_chat,
-        memory=memory,
-        prompt=get_custom_prompt()
-    )
-    
-    for message in st.session_state.chat_history:
-        memory.save_context(
-            {'input':message['human']},
-            {'output':message['AI']}
-        )
-        
-    for message in st.session_state.chat_history:
-        with st.container():
-            st.write(f"you")
-            st.info(message['human'])
-            
-        with st.container():
-            st.write(f"Assistance({st.session_state.selected_persona} mode)")
-            st.success(message['AI'])
             
-        st.write("")
-        
-    st.markdown('### your Message')
-    user_question=st.text_area(
-        "",
-        height=100,
-        placeholder="Type your message here...(shift +Enter to send)",
-        key="user_input",
-        help="Type your message and press shift+Einter or click the send button"
-    )
-    
-    
-    col1, col2, col3 = st.columns([3, 1, 1])
-    with col2:
-        send_button = st.button("📩 Send", use_container_width=True)
-    with col3:
         if st.button("🆕 New Topic", use_container_width=True):
-            memory.clear()
+            # Earlier turns stay on screen but drop out of the model's context
+            st.session_state.topic_start = len(st.session_state.chat_history)
             st.success("Memory cleared for new topic!")
 
-    if send_button and user_question:
+    st.title("Groq chat Assistance")
+        
+    # Filled at the end of the run, once any new message has been appended
+    chat_container=st.container()
+        
+    # chat_input only reruns the script when a message is submitted
+    if user_question:=st.chat_input("Type your message here..."):
         if not st.session_state.start_time:
             st.session_state.start_time = datetime.now()
 
-    with st.spinner("🤔 Thinking..."):
-        try:
-            response = conversation(user_question)
-            message = {
-                "human": user_question,
-                "AI":response['response']
-            }
-            st.session_state.chat_history.append(message)
-            st.rerun()
-        except Exception as e:
-            st.error(f"Error:{str(e)}")
+        with st.spinner("🤔 Thinking..."):
+            try:
+                # Context comes from this session's own history, so switching
+                # persona or model keeps it and other visitors never see it
+                prompt=build_prompt(get_history_window(memory_length), user_question)
+                response=get_chat_model(model, get_api_key()).invoke(prompt)
+                message = {
+                    "human": user_question,
+                    "AI":response.content
+                }
+                st.session_state.chat_history.append(message)
+            except Exception as e:
+                st.error(f"Error:{str(e)}")
             
     st.markdown("---")
     st.markdown(
@@ -173,6 +160,9 @@ def main():
         f"Memory: {memory_length} messages"
     )
 
+    with chat_container:
+        chat_area()
+
 if __name__=="__main__":
     main()
     